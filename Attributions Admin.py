@@ -23,6 +23,7 @@ class CalendarAdmin(admin.ModelAdmin):
 class CalendarRelationAdmin(admin.ModelAdmin):
     list_display = ("calendar", "content_object")
     list_filter = ("inheritable",)
+    list_select_related = ("calendar",)
     fieldsets = (
         (
             None,
@@ -40,6 +41,7 @@ class CalendarRelationAdmin(admin.ModelAdmin):
 @admin.register(EventRelation)
 class EventRelationAdmin(admin.ModelAdmin):
     list_display = ("event", "content_object", "distinction")
+    list_select_related = ("event",)
     fieldsets = (
         (None, {"fields": ["event", ("content_type", "object_id", "distinction")]}),
     )
@@ -51,6 +53,7 @@ class EventAdmin(admin.ModelAdmin):
     list_filter = ("début",)
     ordering = ("-start",)
     date_hierarchy = "start"
+    show_full_result_count = False
     search_fields = ("title", "description")
     fieldsets = (
         (
@@ -1,56 +1,386 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 HOURS = ['9:00AM', '10:15AM', '11:10AM', '13:00AM', '14:15AM', '15:10AM', '16:05AM']
 PEOPLE_CURRENT_COUNT = ['A', 'B', 'C', 'D', 'E', 'F', 'G']
 VISITOR_IDS = ['S1', 'S2', 'S3', 'S4', 'S5', 'S6', 'S7']
 VISITOR_PEOPLE = {'S1': ['A', 'B', 'C'],
-                  'S2': ['A', 'D', 'E'], 
-                  'S3': ['B', 'E', 'D'], 
-                  'S4': ['D', 'E', 'A'], 
-                  'S5': ['C', 'D', 'E'], 
-                  'S6': ['A', 'D', 'C'], 
+                  'S2': ['A', 'D', 'E'],
+                  'S3': ['B', 'E', 'D'],
+                  'S4': ['D', 'E', 'A'],
+                  'S5': ['C', 'D', 'E'],
+                  'S6': ['A', 'D', 'C'],
                   'S7': ['B', 'C', 'D']
                  }
+TIME_LIMIT = 10 # secondes accordées à la recherche optimisée avant de rendre le meilleur résultat
 
 def main():
-    people = {7}
-    for id in PEOPLE_IDS:
+    people = {}
+    for id in PEOPLE_CURRENT_COUNT:
         people[id] = Person(id)
-    visitors = {none}
+    if '--parallel' in sys.argv:
+        planning = solveParallel(VISITOR_PEOPLE, people, timeLimit=TIME_LIMIT)
+        planning.printSchedule()
+        return
+    if '--optimise' in sys.argv:
+        planning = Planning(VISITOR_PEOPLE, people)
+        planning.solve(TIME_LIMIT)
+        planning.printSchedule()
+        return
+    visitors = {}
     for id in VISITOR_IDS:
         visitors[id] = Visitor(id, VISITOR_PEOPLE[id], people)
     for v in visitors.values():
         v.printSchedule()
 
+def firstFreeSlot(busy, slotCount=len(HOURS), start=0):
+    # Les disponibilités sont des entiers utilisés comme bitsets : le bit i à 1
+    # signifie que le créneau i est occupé. Le premier créneau libre est le bit
+    # à 0 le plus bas, trouvé sans parcourir le planning créneau par créneau.
+    free = ~busy & ((1 << slotCount) - 1) & ~((1 << start) - 1)
+    if not free:
+        return -1
+    return (free & -free).bit_length() - 1
+
+def firstCommonFreeSlot(members, slotCount=len(HOURS), start=0):
+    # Premier créneau libre à la fois pour l'élève et tous les moniteurs demandés :
+    # un OU des masques occupés, puis la recherche du premier bit libre.
+    busy = 0
+    for m in members:
+        busy |= m.busy
+    return firstFreeSlot(busy, slotCount, start)
+
 class Person:
-    def __init__(self, id):
-        self.id = id 
-        self.schedule = [False]*7 #False = free, True = busy schedule
-    def scheduleTime(self):
-        #Message de l'emploi de temps disponible dans l'heure défini dans le programme, réponse retournée dans une heure
-    def scheduleTime(self):
-        # Dans l'emplo de temps, chercher la prochaine heure établie au préalable et une réponse doit être reçue dans une heure.
-        for i in range(len(self.schedule)):
-            if not self.schedule[i]:
-                self.schedule[i] = True
-                return HOURS[i]
+    def __init__(self, id, slots=HOURS):
+        self.id = id
+        self.slots = slots
+        self.busy = 0 # bit i à 0 = créneau libre, à 1 = créneau occupé
+    @property
+    def schedule(self):
+        return [bool(self.busy >> i & 1) for i in range(len(self.slots))] #False = free, True = busy schedule
+    def scheduleTime(self, index=None):
+        # Dans l'emploi du temps, chercher la prochaine heure établie au préalable et une réponse doit être reçue dans une heure.
+        if index is None:
+            index = firstFreeSlot(self.busy, len(self.slots))
+        if index < 0 or self.busy >> index & 1:
             return 'heure indisponible'
-        def unscheduledTime(self, index):
-            self.schedule[index] = False
+        self.busy |= 1 << index
+        return self.slots[index]
+    def unscheduleTime(self, index):
+        self.busy &= ~(1 << index)
 
-class Visitor: 
-    def __init__(self, id, people_requests, people):
-        self.id = id 
+class Visitor:
+    def __init__(self, id, people_requests, people, slots=HOURS):
+        self.id = id
+        self.slots = slots
+        self.busy = 0 # moment total où le visiteur est occupé
         self.schedule = {} # {person_id: heure}
+        self.booked = {} # {person_id: index du créneau}
         for p in people_requests:
-            unrecognized_time = set() # moment total où le visiteur est occupé 
-            time = people[p].scheduleTime()
-        self.schedule[p] = time 
-        for t in unrecognized_time : # déprogrammer le temps indisponible depuis la personne 
-            people[p].unscheduleTime(HOURS.index(t))
-        def printSchedule(self):
-            print 'Schedule for %s [Person (time)]: ' % self.id; 
-            if __name__ == '__main__':
+            index = firstCommonFreeSlot((self, people[p]), len(slots))
+            if index < 0:
+                self.schedule[p] = 'heure indisponible'
+                continue
+            self.schedule[p] = people[p].scheduleTime(index)
+            self.booked[p] = index
+            self.busy |= 1 << index
+    def unscheduleTime(self, p, people):
+        # déprogrammer le RDV pris avec la personne et libérer le créneau des deux côtés
+        self.schedule.pop(p, None)
+        index = self.booked.pop(p, None)
+        if index is not None:
+            self.busy &= ~(1 << index)
+            people[p].unscheduleTime(index)
+    def printSchedule(self):
+        print('Schedule for %s [Person (time)]: ' % self.id)
+        for p, heure in self.schedule.items():
+            print('  %s (%s)' % (p, heure))
+
+class Planning:
+    # Mode optimisé : au lieu de servir les visiteurs un par un dans l'ordre du
+    # dictionnaire, on choisit d'abord le plus grand ensemble de demandes que les
+    # capacités permettent (b-couplage maximum), puis on place chaque RDV sur un
+    # créneau en échangeant deux créneaux le long d'une chaîne alternée
+    # (chaîne de Kempe) quand aucun créneau commun n'est libre.
+    def __init__(self, visitor_people, people, slots=HOURS):
+        self.slots = slots
+        self.people = people
+        self.requests = {v: list(dict.fromkeys(ps)) for v, ps in visitor_people.items()}
+        self.blocked = {p: people[p].busy for p in people} # créneaux déjà pris avant la planification
+        self.personBusy = dict(self.blocked)
+        self.visitorBusy = {v: 0 for v in self.requests}
+        self.bookings = {} # {(visitor_id, person_id): index du créneau}
+        self.personAt = {} # {(person_id, index): visitor_id}
+        self.visitorAt = {} # {(visitor_id, index): person_id}
+        self.requesters = {p: [] for p in people} # {person_id: [visitor_id]}
+        for v, ps in self.requests.items():
+            for p in ps:
+                self.requesters[p].append(v)
+    def solve(self, timeLimit=None):
+        # Passé la limite de temps, on garde la sélection obtenue jusque-là et on ne
+        # place plus que les RDV qui ont un créneau commun libre : seuls les chemins
+        # augmentants et les échanges le long des chaînes sont abandonnés.
+        deadline = None if timeLimit is None else time.monotonic() + timeLimit
+        edges = [(v, p) for v, ps in self.requests.items() for p in ps if (v, p) not in self.bookings]
+        selected = self._selectRequests(edges, deadline)
+        changed = set()
+        chains = True
+        for v, p in sorted(edges, key=lambda e: e not in selected):
+            if chains and deadline is not None and time.monotonic() >= deadline:
+                chains = False
+            self._place(v, p, changed, chains)
+        return self.bookings
+    # Modifications incrémentales : seules les demandes touchées par le changement
+    # sont replacées, et chaque méthode renvoie les RDV modifiés
+    # {(visitor_id, person_id): heure, ou 'heure indisponible' si le RDV est perdu}.
+    def blockPerson(self, p, index):
+        changed = set()
+        v = self.personAt.get((p, index))
+        if v is not None:
+            self._unbook(v, p)
+            changed.add((v, p))
+        self.blocked[p] |= 1 << index
+        self.personBusy[p] |= 1 << index
+        self.people[p].busy |= 1 << index
+        if v is not None:
+            self._place(v, p, changed)
+        return self._changes(changed)
+    def unblockPerson(self, p, index):
+        if not self.blocked[p] >> index & 1:
+            return {}
+        self.blocked[p] &= ~(1 << index)
+        self.personBusy[p] &= ~(1 << index)
+        self.people[p].busy &= ~(1 << index)
+        changed = set()
+        self._repair([p], changed)
+        return self._changes(changed)
+    def addVisitor(self, v, people_requests):
+        # Les personnes demandées sont vérifiées avant toute modification du planning.
+        people_requests = list(dict.fromkeys(people_requests))
+        unknown = [p for p in people_requests if p not in self.people]
+        if unknown:
+            raise ValueError('personne inconnue pour %s : %s' % (v, ', '.join(map(str, unknown))))
+        changed = set()
+        self._removeVisitor(v, changed)
+        self.requests[v] = people_requests
+        self.visitorBusy[v] = 0
+        for p in self.requests[v]:
+            self.requesters[p].append(v)
+            self._place(v, p, changed)
+        return self._changes(changed)
+    def removeVisitor(self, v):
+        changed = set()
+        self._removeVisitor(v, changed)
+        return self._changes(changed)
+    def _removeVisitor(self, v, changed):
+        freed = []
+        for p in self.requests.pop(v, ()):
+            self.requesters[p].remove(v)
+            if (v, p) in self.bookings:
+                self._unbook(v, p)
+                changed.add((v, p))
+                freed.append(p)
+        self.visitorBusy.pop(v, None)
+        # les créneaux libérés peuvent satisfaire des demandes restées sans RDV
+        self._repair(freed, changed)
+    def _repair(self, people, changed):
+        for p in people:
+            for v in self.requesters[p]:
+                if (v, p) not in self.bookings:
+                    self._place(v, p, changed)
+    def _changes(self, changed):
+        return {(v, p): self.slots[self.bookings[(v, p)]] if (v, p) in self.bookings else 'heure indisponible'
+                for v, p in changed}
+    def components(self):
+        # Groupes indépendants : deux visiteurs sont liés dès qu'ils demandent une même
+        # personne. Les groupes sont rendus dans l'ordre d'arrivée des visiteurs.
+        parent = {}
+        def find(x):
+            while parent.setdefault(x, x) != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        for v, ps in self.requests.items():
+            for p in ps:
+                parent[find(('p', p))] = find(v)
+        groups = {}
+        for v, ps in self.requests.items():
+            visitors, people = groups.setdefault(find(v), ([], set()))
+            visitors.append(v)
+            people.update(ps)
+        return list(groups.values())
+    def unassigned(self):
+        return [(v, p) for v, ps in self.requests.items() for p in ps if (v, p) not in self.bookings]
+    def schedule(self, v):
+        return {p: self.slots[self.bookings[(v, p)]] if (v, p) in self.bookings else 'heure indisponible'
+                for p in self.requests[v]}
+    def printSchedule(self):
+        for v in self.requests:
+            print('Schedule for %s [Person (time)]: ' % v)
+            for p, heure in self.schedule(v).items():
+                print('  %s (%s)' % (p, heure))
+    def _book(self, v, p, index):
+        self.bookings[(v, p)] = index
+        self.personAt[(p, index)] = v
+        self.visitorAt[(v, index)] = p
+        self.personBusy[p] |= 1 << index
+        self.visitorBusy[v] |= 1 << index
+        self.people[p].busy |= 1 << index
+    def _unbook(self, v, p):
+        index = self.bookings.pop((v, p))
+        del self.personAt[(p, index)]
+        del self.visitorAt[(v, index)]
+        self.personBusy[p] &= ~(1 << index)
+        self.visitorBusy[v] &= ~(1 << index)
+        self.people[p].busy &= ~(1 << index)
+        return index
+    def _selectRequests(self, edges, deadline):
+        # b-couplage maximum : chaque visiteur et chaque personne peut recevoir au plus
+        # autant de RDV qu'il lui reste de créneaux libres.
+        slotCount = len(self.slots)
+        capV = {v: slotCount - self.visitorBusy[v].bit_count() for v in self.requests}
+        capP = {p: slotCount - self.personBusy[p].bit_count() for p in self.people}
+        selected = set()
+        edgesOf = {}
+        for v, p in edges:
+            edgesOf.setdefault(v, []).append(p)
+            if capV[v] > 0 and capP[p] > 0:
+                selected.add((v, p))
+                capV[v] -= 1
+                capP[p] -= 1
+        holders = {}
+        for v, p in selected:
+            holders.setdefault(p, set()).add(v)
+        # Tant qu'un passage trouve un chemin augmentant, on recommence : un visiteur
+        # qui a encore de la place est relancé jusqu'à ce qu'aucun chemin ne parte de lui.
+        progress = True
+        while progress:
+            progress = False
+            for start in edgesOf:
+                while capV[start] > 0:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return selected
+                    if not self._augment(start, edgesOf, selected, holders, capV, capP):
+                        break
+                    progress = True
+        return selected
+    def _augment(self, start, edgesOf, selected, holders, capV, capP):
+        # chemin augmentant : demande non retenue vers une personne, puis demande
+        # retenue de cette personne vers un autre visiteur, jusqu'à une personne qui a encore de la place
+        parent = {start: None}
+        queue = [start]
+        end = None
+        while queue and end is None:
+            nextQueue = []
+            for v in queue:
+                for p in edgesOf.get(v, ()):
+                    if (v, p) in selected or ('p', p) in parent:
+                        continue
+                    parent[('p', p)] = v
+                    if capP[p] > 0:
+                        end = p
+                        break
+                    for w in holders.get(p, ()):
+                        if w not in parent:
+                            parent[w] = p
+                            nextQueue.append(w)
+                if end is not None:
+                    break
+            queue = nextQueue
+        if end is None:
+            return False
+        p = end
+        capP[p] -= 1
+        capV[start] -= 1
+        while True:
+            v = parent[('p', p)]
+            selected.add((v, p))
+            holders.setdefault(p, set()).add(v)
+            if v == start:
+                return True
+            previous = parent[v]
+            selected.discard((v, previous))
+            holders[previous].discard(v)
+            p = previous
+    def _place(self, v, p, changed, chains=True):
+        full = (1 << len(self.slots)) - 1
+        freeV = ~self.visitorBusy[v] & full
+        freeP = ~self.personBusy[p] & full
+        common = freeV & freeP
+        if common:
+            self._book(v, p, (common & -common).bit_length() - 1)
+            changed.add((v, p))
+            return True
+        if not chains:
+            return False
+        for a in _bits(freeV & ~self.blocked[p]):
+            for b in _bits(freeP):
+                path = self._alternatingPath(p, a, b)
+                if path is None:
+                    continue
+                moves = [(w, q, self._unbook(w, q)) for w, q in path]
+                for w, q, index in moves:
+                    self._book(w, q, b if index == a else a)
+                    changed.add((w, q))
+                self._book(v, p, a)
+                changed.add((v, p))
+                return True
+        return False
+    def _alternatingPath(self, p, a, b):
+        # Chaîne a/b partant de `p` : échanger a et b dessus libère `a` chez `p` sans
+        # jamais atteindre le visiteur (graphe biparti). Renvoie None si l'échange
+        # tomberait sur un créneau bloqué.
+        path = []
+        person, color = p, a
+        while True:
+            v = self.personAt.get((person, color))
+            if v is None:
+                return path
+            path.append((v, person))
+            other = b if color == a else a
+            person = self.visitorAt.get((v, other))
+            if person is None:
+                return path
+            path.append((v, person))
+            if self.blocked[person] >> color & 1:
+                return None
+
+def solveParallel(visitor_people, people, slots=HOURS, timeLimit=None, workers=None):
+    # Les groupes indépendants (voir Planning.components) sont résolus dans des
+    # processus séparés puis fusionnés dans l'ordre des groupes : le résultat est
+    # identique à celui de Planning.solve, quel que soit le nombre de processus.
+    # Une seule échéance pour tous les groupes : un groupe pris tard par un
+    # processus n'a que le temps restant, et non une nouvelle limite complète.
+    deadline = None if timeLimit is None else time.time() + timeLimit
+    planning = Planning(visitor_people, people, slots)
+    tasks = [({v: planning.requests[v] for v in visitors}, {p: planning.blocked[p] for p in members}, slots, deadline)
+             for visitors, members in planning.components()]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        for bookings in pool.map(_solveComponent, tasks, chunksize=max(1, len(tasks) // (workers * 4))):
+            for (v, p), index in bookings.items():
+                planning._book(v, p, index)
+    return planning
+
+def _solveComponent(task):
+    visitor_people, blocked, slots, deadline = task
+    people = {}
+    for p, busy in blocked.items():
+        people[p] = Person(p, slots)
+        people[p].busy = busy
+    planning = Planning(visitor_people, people, slots)
+    planning.solve(None if deadline is None else max(0, deadline - time.time()))
+    return planning.bookings
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+if __name__ == '__main__':
     sys.exit(main())
 
-#endregion 
-        
-        
\ No newline at end of file
+#endregion
@@ -1,10 +1,449 @@
 from os import times
-from calendrier.programmation.ressources import Slot 
+from calendrier.programmation.ressources import Event, Slot 
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import csv
+import datetime
 import itertools 
+import random
+import re
+import sqlite3
+import threading
+import zoneinfo
+
+
+class SlotTable:
+    # Les créneaux sont rangés par colonnes (tableaux typés d'identifiants et
+    # d'entiers) au lieu d'un objet Slot et de deux chaînes par créneau. Un Slot
+    # n'est construit qu'au moment où on le lit.
+    def __init__(self, rooms, days, times_and_durations, room_capacity, day_period, excluded=(), timezone="Europe/Paris"):
+        self.venues = list(rooms)
+        self.days = list(days)
+        self.dates = [datetime.datetime.strptime(day, "%d-%b-%Y").date() for day in self.days]
+        self.times_and_durations = list(times_and_durations)
+        self.periods = list(dict.fromkeys(day_period[t] for t in self.times_and_durations))
+        self.venue = array('H')
+        self.day = array('H')
+        self.period = array('H')
+        self.time = array('H')
+        self.start = array('q') # début en secondes depuis l'epoch (UTC), l'heure locale étant celle de `timezone`
+        self.duration = array('I')
+        self.capacity = array('I')
+        self.session = array('I')
+        excluded = set(excluded)
+        zone = zoneinfo.ZoneInfo(timezone)
+        clocks = []
+        periodIds = []
+        for time, duration in self.times_and_durations:
+            hour, minute = time.split(':')
+            clocks.append(datetime.time(int(hour), int(minute)))
+            periodIds.append(self.periods.index(day_period[(time, duration)]))
+        # heures locales converties une fois par (jour, heure), changement d'heure compris
+        starts = [[int(datetime.datetime.combine(date, clock, zone).timestamp()) for clock in clocks] for date in self.dates]
+        # une session par (jour, période de la journée), comme 'Date: 13-Sep-2022 Matin'
+        self.sessions = [f'Date: {day} {label}' for day in self.days for label in self.periods]
+        # Catalogue : identifiants internés et index (salle, jour) -> plage de lignes,
+        # semaine -> jours, période -> positions dans la journée, session -> lignes.
+        self.venueIds = {room: v for v, room in enumerate(self.venues)}
+        self.dayIds = {day: d for d, day in enumerate(self.days)}
+        self.periodIds = {label: i for i, label in enumerate(self.periods)}
+        self.sessionIds = {label: i for i, label in enumerate(self.sessions)}
+        self.periodTimes = [[t for t, i in enumerate(periodIds) if i == period] for period in range(len(self.periods))]
+        self.weekDays = {}
+        for d, date in enumerate(self.dates):
+            self.weekDays.setdefault(tuple(date.isocalendar())[:2], []).append(d)
+        self.ranges = {}
+        self.bySession = {}
+        for v, room in enumerate(self.venues):
+            for d, day in enumerate(self.days):
+                if (room, day) in excluded:
+                    continue
+                self.ranges[(v, d)] = range(len(self.venue), len(self.venue) + len(self.times_and_durations))
+                for t, (time, duration) in enumerate(self.times_and_durations):
+                    self.bySession.setdefault(d * len(self.periods) + periodIds[t], array('I')).append(len(self.venue))
+                    self.venue.append(v)
+                    self.day.append(d)
+                    self.period.append(periodIds[t])
+                    self.time.append(t)
+                    self.start.append(starts[d][t])
+                    self.duration.append(duration)
+                    self.capacity.append(room_capacity[room])
+                    self.session.append(d * len(self.periods) + periodIds[t])
+
+    def __len__(self):
+        return len(self.venue)
+
+    def __getitem__(self, i):
+        time, duration = self.times_and_durations[self.time[i]]
+        return Slot(venue=self.venues[self.venue[i]], starts_at=f"{self.days[self.day[i]]} {time}",
+                    duration=duration, capacity=self.capacity[i], session=self.sessions[self.session[i]])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def select(self, venue=None, day=None, period=None, week=None):
+        # Indices des créneaux retenus, obtenus par l'index (salle, jour) sans
+        # parcourir la table ; `week` est un couple ISO (année, semaine). Les
+        # filtres se cumulent (`day` et `week` compris) et une valeur absente de
+        # la table ne retient aucun créneau.
+        def ids(index, key, count):
+            if key is None:
+                return range(count)
+            return [index[key]] if key in index else []
+        venues = ids(self.venueIds, venue, len(self.venues))
+        days = ids(self.dayIds, day, len(self.days))
+        if week is not None:
+            weekDays = self.weekDays.get(tuple(week), [])
+            days = [d for d in days if d in weekDays]
+        times = range(len(self.times_and_durations)) if period is None else \
+            [t for p in ids(self.periodIds, period, len(self.periods)) for t in self.periodTimes[p]]
+        indices = []
+        for v in venues:
+            for d in days:
+                rows = self.ranges.get((v, d))
+                if rows is not None:
+                    indices.extend(rows.start + t for t in times)
+        return indices
+
+    def sessionSlots(self, session):
+        return self.bySession.get(self.sessionIds.get(session), array('I'))
+
+    def slots(self, indices):
+        return (self[i] for i in indices)
+
+
+class Reservations:
+    # Réservation des places d'une SlotTable en mémoire : un compteur par créneau,
+    # protégé par un verrou choisi parmi `shards` (créneau i -> verrou i % shards).
+    # Deux créneaux différents ne se bloquent presque jamais ; un créneau ne
+    # descend jamais sous zéro ni ne dépasse sa capacité.
+    # reserve() rend un numéro de réservation (None si complet) et release()
+    # n'agit que sur une réservation encore active : une double libération est sans effet.
+    def __init__(self, table, shards=64):
+        self.capacity = array('I', table.capacity)
+        self.remaining = array('I', table.capacity)
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.active = {} # {numéro de réservation: créneau}
+        self.ids = itertools.count(1)
+
+    def reserve(self, i):
+        with self.locks[i % len(self.locks)]:
+            if not self.remaining[i]:
+                return None
+            self.remaining[i] -= 1
+            reservation = next(self.ids)
+            self.active[reservation] = i
+            return reservation
+
+    def release(self, reservation):
+        i = self.active.pop(reservation, None)
+        if i is None:
+            return False
+        with self.locks[i % len(self.locks)]:
+            if self.remaining[i] < self.capacity[i]:
+                self.remaining[i] += 1
+        return True
+
+    def remainingOf(self, i):
+        return self.remaining[i]
+
+
+class SqliteReservations:
+    # Même interface, les compteurs vivent en base : la réservation est un
+    # UPDATE conditionnel (compare-and-swap), atomique aussi sous PostgreSQL, et
+    # la libération retire d'abord la ligne de réservation avant de rendre la place.
+    # Sur une base existante les compteurs sont conservés ; reset() les remet à la capacité.
+    def __init__(self, path, table=None):
+        self.path = path
+        self.local = threading.local()
+        if table is not None:
+            with contextlib.closing(sqlite3.connect(path)) as conn, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS slot_capacity "
+                             "(id INTEGER PRIMARY KEY, capacity INTEGER NOT NULL, remaining INTEGER NOT NULL, "
+                             "CHECK (remaining >= 0 AND remaining <= capacity))")
+                conn.execute("CREATE TABLE IF NOT EXISTS reservation "
+                             "(id INTEGER PRIMARY KEY AUTOINCREMENT, slot INTEGER NOT NULL REFERENCES slot_capacity (id))")
+                conn.executemany("INSERT OR IGNORE INTO slot_capacity (id, capacity, remaining) VALUES (?, ?, ?)",
+                                 ((i, capacity, capacity) for i, capacity in enumerate(table.capacity)))
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        return conn
+
+    def reserve(self, i):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "UPDATE slot_capacity SET remaining = remaining - 1 WHERE id = ? AND remaining > 0", (i,))
+            reservation = None
+            if cursor.rowcount == 1:
+                reservation = conn.execute("INSERT INTO reservation (slot) VALUES (?)", (i,)).lastrowid
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return reservation
+
+    def release(self, reservation):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT slot FROM reservation WHERE id = ?", (reservation,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM reservation WHERE id = ?", (reservation,))
+                conn.execute("UPDATE slot_capacity SET remaining = remaining + 1 "
+                             "WHERE id = ? AND remaining < capacity", row)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row is not None
+
+    def reset(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM reservation")
+        conn.execute("UPDATE slot_capacity SET remaining = capacity")
+        conn.execute("COMMIT")
+
+    def remainingOf(self, i):
+        return self._connection().execute("SELECT remaining FROM slot_capacity WHERE id = ?", (i,)).fetchone()[0]
+
+
+def loadTest(reservations, table, attempts=5000, workers=500, hotSlots=20, seed=0):
+    # Simule l'ouverture des inscriptions : `attempts` réservations lancées par
+    # `workers` fils sur quelques créneaux très demandés, puis vérifie qu'aucun
+    # créneau n'a été surréservé et que chaque place libre au départ (une base
+    # existante peut déjà en avoir pris) a bien été prise.
+    rng = random.Random(seed)
+    hot = rng.sample(range(len(table)), min(hotSlots, len(table)))
+    requests = [rng.choice(hot) for _ in range(attempts)]
+    before = {i: reservations.remainingOf(i) for i in hot}
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(reservations.reserve, requests))
+    booked = {}
+    for i, reservation in zip(requests, results):
+        if reservation is not None:
+            booked[i] = booked.get(i, 0) + 1
+    for i in hot:
+        expected = min(before[i], requests.count(i))
+        count = booked.get(i, 0)
+        remaining = reservations.remainingOf(i)
+        if count > expected or remaining < before[i] - count:
+            raise AssertionError(f"créneau {i} surréservé : {count} réservations pour {expected} attendues, "
+                                 f"{remaining} places restantes sur {before[i]}")
+        if count < expected or remaining > before[i] - count:
+            raise AssertionError(f"créneau {i} sous-réservé : {count} réservations pour {expected} attendues, "
+                                 f"{remaining} places restantes sur {before[i]}")
+    return sum(booked.values())
+
+def readTalks(source, chunkSize=10000, skipHeader=False):
+    # Lit les RDV par paquets de `chunkSize` lignes (nom, durée, tags) depuis un
+    # fichier CSV, un fichier iCalendar (.ics) ou des lignes déjà en mémoire :
+    # la mémoire utilisée reste bornée par la taille d'un paquet.
+    if isinstance(source, str) and source.lower().endswith('.ics'):
+        rows = _readIcs(source)
+    elif isinstance(source, str):
+        rows = _readCsv(source, skipHeader)
+    else:
+        rows = iter(source)
+    while True:
+        chunk = list(itertools.islice(rows, chunkSize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _readCsv(path, skipHeader):
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = csv.reader(f)
+        if skipHeader:
+            next(rows, None)
+        yield from rows
+
+
+def _readIcs(path, timezone="Europe/Paris"):
+    # Chaque VEVENT donne une ligne (SUMMARY, durée en minutes, CATEGORIES). Les
+    # propriétés des sous-composants (VALARM...) ne remplacent pas celles du RDV.
+    # Les heures sans fuseau (ni Z ni TZID) sont lues dans `timezone`.
+    timezone = zoneinfo.ZoneInfo(timezone)
+    event = None
+    depth = 0 # profondeur dans les sous-composants du VEVENT courant
+    with open(path, encoding='utf-8') as f:
+        for line in _unfoldIcs(f):
+            name, _, value = line.partition(':')
+            name, *params = name.split(';')
+            name = name.upper()
+            if name == 'BEGIN':
+                if event is not None:
+                    depth += 1
+                elif value.upper() == 'VEVENT':
+                    event = {}
+            elif name == 'END' and event is not None:
+                if depth:
+                    depth -= 1
+                elif value.upper() == 'VEVENT':
+                    yield _icsRow(event, timezone)
+                    event = None
+            elif event is not None and not depth:
+                # {propriété: (paramètres, valeur)}, ex. DTSTART;TZID=Europe/Paris:20220913T090000
+                event[name] = ({k.upper(): v.strip('"') for k, _, v in (p.partition('=') for p in params)}, value)
+
+
+def _icsRow(event, timezone):
+    # Une valeur illisible ou un fuseau inconnu donne une durée invalide : la ligne part dans les rejets.
+    try:
+        if 'DURATION' in event:
+            minutes = _icsDuration(event['DURATION'][1])
+        elif 'DTSTART' in event and 'DTEND' in event:
+            end = _icsDate(*event['DTEND'], timezone)
+            minutes = (end - _icsDate(*event['DTSTART'], timezone)) // datetime.timedelta(minutes=1)
+        else:
+            minutes = -1
+    except (ValueError, zoneinfo.ZoneInfoNotFoundError):
+        minutes = -1
+    summary = _icsText(event.get('SUMMARY', ({}, ''))[1])
+    categories = _icsText(event.get('CATEGORIES', ({}, ''))[1], separator=',')
+    return [summary, str(minutes), [t for t in categories if t]]
+
+
+ICS_ESCAPES = {'\\': '\\', ';': ';', ',': ',', 'n': '\n', 'N': '\n'}
+
+
+def _icsText(value, separator=None):
+    # Valeur TEXT (RFC 5545, 3.3.11) : \, \; \\ et \n sont déséchappés. Avec
+    # `separator`, renvoie la liste découpée sur les séparateurs non échappés.
+    parts = ['']
+    chars = iter(value)
+    for c in chars:
+        if c == '\\':
+            c = next(chars, '')
+            parts[-1] += ICS_ESCAPES.get(c, '\\' + c)
+        elif c == separator:
+            parts.append('')
+        else:
+            parts[-1] += c
+    return parts if separator is not None else parts[0]
+
+
+def _unfoldIcs(lines):
+    # Les lignes iCalendar longues continuent sur la suivante, qui commence par un espace.
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _icsDate(params, value, timezone):
+    # Instant UTC d'un DATE-TIME : 20220913T090000Z en UTC, avec TZID dans ce
+    # fuseau, sinon dans `timezone`. Une DATE seule (20220913, RDV sur la journée)
+    # compte en jours entiers, sans changement d'heure.
+    if 'T' not in value:
+        return datetime.datetime.strptime(value, "%Y%m%d").replace(tzinfo=datetime.timezone.utc)
+    if value.endswith('Z'):
+        zone = datetime.timezone.utc
+        value = value[:-1]
+    elif 'TZID' in params:
+        zone = zoneinfo.ZoneInfo(params['TZID'])
+    else:
+        zone = timezone
+    local = datetime.datetime.strptime(value, "%Y%m%dT%H%M%S").replace(tzinfo=zone)
+    return local.astimezone(datetime.timezone.utc)
+
+
+ICS_DURATION = re.compile(r'\+?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+
+def _icsDuration(value):
+    # P1D -> 1440, PT1H10M -> 70 ; une durée négative ou mal formée lève ValueError.
+    match = ICS_DURATION.fullmatch(value.strip())
+    if match is None:
+        raise ValueError(f"durée iCalendar invalide : {value}")
+    weeks, days, hours, minutes, seconds = (int(g or 0) for g in match.groups())
+    return ((weeks * 7 + days) * 24 + hours) * 60 + minutes + seconds // 60
+
+
+def validateTalks(chunk, maxDuration=24 * 60):
+    # Contrôle d'un paquet entier : nom non vide, durée entière entre 1 et
+    # `maxDuration` minutes, tags nettoyés. Renvoie les lignes valides et rejetées.
+    valid = []
+    rejected = []
+    for row in chunk:
+        name = row[0].strip() if row else ''
+        duration = _duration(row[1]) if len(row) > 1 else -1
+        if name and 0 < duration <= maxDuration:
+            valid.append((name, duration, _tags(row[2]) if len(row) > 2 else []))
+        else:
+            rejected.append(row)
+    return valid, rejected
+
+
+def _duration(value):
+    if isinstance(value, int):
+        return value
+    # isdecimal() et non isdigit() : '²' est un chiffre mais int('²') lève ValueError.
+    value = value.strip()
+    return int(value) if value.isdecimal() else -1
+
+
+def _tags(value):
+    if isinstance(value, str):
+        value = [value]
+    return [t.strip() for t in value if t.strip()]
+
+
+def importTalks(source, write, chunkSize=10000, progress=None, skipHeader=False):
+    # Importe les RDV paquet par paquet : lecture, contrôle, puis un seul appel à
+    # `write` par paquet (par exemple talks.extend ou un SqliteTalkWriter).
+    imported = 0
+    rejected = 0
+    for chunk in readTalks(source, chunkSize, skipHeader):
+        valid, invalid = validateTalks(chunk)
+        write([Event(name=name, duration=duration, tags=tags, demand=None) for name, duration, tags in valid])
+        imported += len(valid)
+        rejected += len(invalid)
+        if progress is not None:
+            progress(imported, rejected)
+    return imported, rejected
+
+
+class SqliteTalkWriter:
+    # Écrit chaque paquet de RDV en une seule transaction. S'utilise dans un
+    # bloc `with`, qui ferme la connexion à la sortie, ou avec close().
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS talks "
+                          "(id INTEGER PRIMARY KEY, name TEXT NOT NULL, duration INTEGER NOT NULL, tags TEXT NOT NULL)")
+
+    def __call__(self, events):
+        with self.conn:
+            self.conn.executemany("INSERT INTO talks (name, duration, tags) VALUES (?, ?, ?)",
+                                  ((e.name, e.duration, ','.join(e.tags)) for e in events))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 rooms = ["Date de rdv", "Elève x"]
 days = ["13-Sep-2022", "14-Sep-2022"]
-times_and_durations = [('9:00', 70), ('10:10', 70), ('11:15', 70), ('13:00', 70), ('14:10', 70), ('15:15', 70), ('16:20', 70)],
+times_and_durations = [('9:00', 70), ('10:10', 70), ('11:15', 70), ('13:00', 70), ('14:10', 70), ('15:15', 70), ('16:20', 70)]
 day_period = {('9:00', 70) : "Matin",
               ('10:10', 70) : "Matin",
               ('11:15', 70) : "Matin",
@@ -13,38 +452,32 @@ day_period = {('9:00', 70) : "Matin",
               ('15:15', 70) : "Après-midi",
               ('16:20', 70) : "Après-midi"}
 
-room_capacity = {"Date de rdv": x,
-                 "Elève x": y}
+# Configuration de l'auto école : exécutée seulement quand le script est lancé directement.
+if __name__ == '__main__':
+    room_capacity = {"Date de rdv": x,
+                     "Elève x": y}
 
-talk_slots = []
-for room, day, times_and_durations in itertools.product(rooms, days, times_and_durations):
-    if (room, day) not in [("Date de rdv", '13-Sep-2016'),] # La date de rdv utilisé pour le jour configuré sur le calendrier.
-    time, duration = times_and_duration
-    session = f'Date: {day} {day_period[time_and_duration]}'
-    starts_at = f"{day} {time}"
-    capacity = room_capacity[rdv]
-    talk_slots.append(Slot(venue=room, starts_at=starts_at, durée=durée, session_disponible= session_disponible)),
-len(talk_slots)
+    # La date de rdv utilisé pour le jour configuré sur le calendrier est exclue.
+    talk_slots = SlotTable(rooms, days, times_and_durations, room_capacity, day_period,
+                           excluded=[("Date de rdv", '13-Sep-2016')])
+    len(talk_slots)
 
-test()
-rooms = ["Date de rdv", "Elève x"]
-days = ['13-Sep-2022']
-times_and_durations = [('9:00', 70), ('10:10', 70), ('11:15', 70), ('13:00', 70), ('14:10', 70), ('15:15', 70), ('16:20', 70)]
+    test()
+    rooms = ["Date de rdv", "Elève x"]
+    days = ['13-Sep-2022']
+    times_and_durations = [('9:00', 70), ('10:10', 70), ('11:15', 70), ('13:00', 70), ('14:10', 70), ('15:15', 70), ('16:20', 70)]
 
-for room, day, time_and_duration in intertools.product(rooms, days, times_and_durations):
-    time, duration = time_and_duration
-    session = f"{day} {time}"
-    starts_at = f"{day} {time}"
-    capacity = 1
+    for room, day, time_and_duration in intertools.product(rooms, days, times_and_durations):
+        time, duration = time_and_duration
+        session = f"{day} {time}"
+        starts_at = f"{day} {time}"
+        capacity = 1
 
-plenary_slots = [Slot(venue="Rdv au préalable", starts_at='13-Sep-2022 09:00', duration=70, session='13-Sep-2022 09:00', capacity=1)],
+    plenary_slots = [Slot(venue="Rdv au préalable", starts_at='13-Sep-2022 09:00', duration=70, session='13-Sep-2022 09:00', capacity=1)],
 
-talks = [] 
-for row in raw_talks:
-    name = row[0]
-    duration = int(row[1])
-    tags = [row[2]] if row[2] != throw exception else[]
-    talks.append(Date(name=name, duration=duration, indisponibilité = slots.occupé, demand=None))
-len(talks)
+    talks = [] 
+    importTalks(raw_talks, talks.extend,
+                progress=lambda imported, rejected: print(f"{imported} RDV importés, {rejected} rejetés"))
+    len(talks)
 
-// Ecrit dans la console la disponibilité du rdv à la date et heure choisie au préalable
\ No newline at end of file
+    # Ecrit dans la console la disponibilité du rdv à la date et heure choisie au préalable
\ No newline at end of file
@@ -0,0 +1,226 @@
+import collections
+import contextlib
+import datetime
+import importlib.util
+import os
+import sqlite3
+import sys
+import tempfile
+import types
+import unittest
+
+try:
+    import calendrier.programmation.ressources # Slot et Event du script de configuration
+except ImportError:
+    # Le paquet calendrier.programmation n'est pas dans le dépôt : un module minimal
+    # fournit Slot et Event pour pouvoir charger le script de configuration.
+    ressources = types.ModuleType("calendrier.programmation.ressources")
+    ressources.Slot = collections.namedtuple("Slot", "venue starts_at duration capacity session")
+    ressources.Event = collections.namedtuple("Event", "name duration tags demand")
+    sys.modules.setdefault("calendrier", types.ModuleType("calendrier"))
+    sys.modules.setdefault("calendrier.programmation", types.ModuleType("calendrier.programmation"))
+    sys.modules["calendrier.programmation.ressources"] = ressources
+
+chemin = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      "Configuration de l'affichage et des dates choisies au préalable.py")
+spec = importlib.util.spec_from_file_location("configuration_creneaux", chemin)
+creneaux = importlib.util.module_from_spec(spec)
+sys.modules["configuration_creneaux"] = creneaux
+spec.loader.exec_module(creneaux)
+
+TIMES_AND_DURATIONS = [('9:00', 70), ('10:10', 70), ('11:15', 70), ('13:00', 70), ('14:10', 70), ('15:15', 70), ('16:20', 70)]
+DAY_PERIOD = {t: "Matin" if i < 3 else "Après-midi" for i, t in enumerate(TIMES_AND_DURATIONS)}
+
+
+class SlotTableTests(unittest.TestCase):
+    def setUp(self):
+        self.table = creneaux.SlotTable(
+            ["Date de rdv", "Elève x"],
+            ["13-Sep-2022", "14-Sep-2022", "20-Sep-2022", "30-Oct-2022"],
+            TIMES_AND_DURATIONS,
+            {"Date de rdv": 2, "Elève x": 1},
+            DAY_PERIOD,
+            excluded=[("Date de rdv", "13-Sep-2022")],
+        )
+
+    def test_slot_a_la_demande(self):
+        slot = self.table[0]
+        self.assertEqual(len(self.table), 7 * 7)
+        self.assertEqual(slot.venue, "Date de rdv")
+        self.assertEqual(slot.starts_at, "14-Sep-2022 9:00")
+        self.assertEqual(slot.duration, 70)
+        self.assertEqual(slot.capacity, 2)
+        self.assertEqual(slot.session, "Date: 14-Sep-2022 Matin")
+        self.assertEqual(list(self.table)[0], slot)
+
+    def test_debut_en_heure_de_paris(self):
+        # 9:00 à Paris le 14 septembre (heure d'été) = 7:00 UTC ; le 30 octobre
+        # (heure d'hiver, jour du changement d'heure) = 8:00 UTC.
+        utc = datetime.timezone.utc
+        self.assertEqual(self.table.start[0], datetime.datetime(2022, 9, 14, 7, 0, tzinfo=utc).timestamp())
+        dernier = self.table.select(venue="Date de rdv", day="30-Oct-2022")[0]
+        self.assertEqual(self.table.start[dernier], datetime.datetime(2022, 10, 30, 8, 0, tzinfo=utc).timestamp())
+
+    def test_semaine_iso(self):
+        self.assertEqual(self.table.weekDays[(2022, 37)], [0, 1])
+        self.assertEqual(self.table.weekDays[(2022, 38)], [2])
+        self.assertEqual(self.table.weekDays[(2022, 43)], [3])
+
+    def test_select_identique_au_parcours_complet(self):
+        def parcours(venue=None, day=None, period=None, week=None):
+            indices = []
+            for i, slot in enumerate(self.table):
+                jour = slot.starts_at.split()[0]
+                if venue is not None and slot.venue != venue:
+                    continue
+                if day is not None and jour != day:
+                    continue
+                if period is not None and not slot.session.endswith(period):
+                    continue
+                if week is not None and tuple(datetime.datetime.strptime(jour, "%d-%b-%Y").isocalendar())[:2] != week:
+                    continue
+                indices.append(i)
+            return indices
+        for venue in (None, "Date de rdv", "Elève x", "Salle inconnue"):
+            for day in (None, "13-Sep-2022", "20-Sep-2022", "01-Jan-2023"):
+                for period in (None, "Matin", "Après-midi", "Soir"):
+                    for week in (None, (2022, 37), (2022, 43), (2023, 1)):
+                        filtres = dict(venue=venue, day=day, period=period, week=week)
+                        self.assertEqual(self.table.select(**filtres), parcours(**filtres), filtres)
+
+    def test_creneaux_d_une_session(self):
+        indices = list(self.table.sessionSlots("Date: 14-Sep-2022 Matin"))
+        self.assertEqual(indices, [0, 1, 2, 28, 29, 30])
+        self.assertTrue(all(self.table[i].session == "Date: 14-Sep-2022 Matin" for i in indices))
+        self.assertEqual(list(self.table.sessionSlots("Date: 13-Sep-2022 Soir")), [])
+
+
+class ReservationsTests(unittest.TestCase):
+    def setUp(self):
+        self.table = creneaux.SlotTable(["Date de rdv", "Elève x"], ["13-Sep-2022"], TIMES_AND_DURATIONS[:2],
+                                        {"Date de rdv": 2, "Elève x": 5}, DAY_PERIOD)
+        self.dossier = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.dossier.name, "reservations.db")
+
+    def tearDown(self):
+        self.dossier.cleanup()
+
+    def moteurs(self):
+        return [creneaux.Reservations(self.table), creneaux.SqliteReservations(self.base, self.table)]
+
+    def test_double_liberation_sans_effet(self):
+        for reservations in self.moteurs():
+            reservation = reservations.reserve(0)
+            self.assertTrue(reservations.release(reservation))
+            self.assertFalse(reservations.release(reservation))
+            self.assertEqual([reservations.reserve(0) is not None for _ in range(3)], [True, True, False])
+
+    def test_pas_de_remise_a_zero_au_redemarrage(self):
+        reservations = creneaux.SqliteReservations(self.base, self.table)
+        reservations.reserve(0)
+        reservations.reserve(0)
+        reservations = creneaux.SqliteReservations(self.base, self.table)
+        self.assertIsNone(reservations.reserve(0))
+        reservations.reset()
+        self.assertEqual(reservations.remainingOf(0), 2)
+
+    def test_charge_sans_surreservation(self):
+        self.assertEqual(creneaux.loadTest(creneaux.Reservations(self.table), self.table, hotSlots=4), 14)
+        sqlite = creneaux.SqliteReservations(self.base, self.table)
+        self.assertEqual(creneaux.loadTest(sqlite, self.table, attempts=500, workers=50, hotSlots=4), 14)
+
+    def test_charge_sur_une_base_deja_entamee(self):
+        # Deux places déjà prises avant le test : seules les 12 restantes sont attendues.
+        for reservations in self.moteurs():
+            reservations.reserve(0)
+            reservations.reserve(2)
+            self.assertEqual(reservations.remainingOf(0), 1)
+            self.assertEqual(creneaux.loadTest(reservations, self.table, attempts=500, workers=50, hotSlots=4), 12)
+
+    def test_charge_signale_sur_et_sous_reservation(self):
+        class Refus(creneaux.Reservations):
+            def reserve(self, i):
+                return None
+        class SansLimite(creneaux.Reservations):
+            def reserve(self, i):
+                return next(self.ids)
+        with self.assertRaisesRegex(AssertionError, "sous-réservé"):
+            creneaux.loadTest(Refus(self.table), self.table, attempts=50, workers=5, hotSlots=4)
+        with self.assertRaisesRegex(AssertionError, "surréservé"):
+            creneaux.loadTest(SansLimite(self.table), self.table, attempts=50, workers=5, hotSlots=4)
+
+
+class ImportTests(unittest.TestCase):
+    def importer(self, contenu, suffixe=".ics"):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, "import" + suffixe)
+            with open(chemin, "w", encoding="utf-8") as f:
+                f.write(contenu)
+            talks = []
+            compte = creneaux.importTalks(chemin, talks.extend, skipHeader=suffixe == ".csv")
+        return compte, [(t.name, t.duration, t.tags) for t in talks]
+
+    def test_alarme_ignoree(self):
+        compte, talks = self.importer(
+            "BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:Lecon conduite\r\n"
+            "DTSTART:20220913T090000Z\r\nDTEND:20220913T101000Z\r\nCATEGORIES:route\r\n"
+            "BEGIN:VALARM\r\nACTION:EMAIL\r\nSUMMARY:Rappel\r\nDURATION:PT5M\r\nREPEAT:1\r\nEND:VALARM\r\n"
+            "END:VEVENT\r\nEND:VCALENDAR\r\n")
+        self.assertEqual(compte, (1, 0))
+        self.assertEqual(talks, [("Lecon conduite", 70, ["route"])])
+
+    def test_journee_entiere_et_durees_en_jours(self):
+        compte, talks = self.importer(
+            "BEGIN:VCALENDAR\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Examen\r\nDTSTART;VALUE=DATE:20220913\r\nDTEND;VALUE=DATE:20220914\r\nEND:VEVENT\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Stage\r\nDURATION:P1D\r\nEND:VEVENT\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Code\r\n  DU SOIR\r\nDURATION:PT1H10M\r\nEND:VEVENT\r\n"
+            "END:VCALENDAR\r\n")
+        self.assertEqual(compte, (3, 0))
+        self.assertEqual(talks, [("Examen", 1440, []), ("Stage", 1440, []), ("Code DU SOIR", 70, [])])
+
+    def test_echappements_et_fuseaux(self):
+        # 9:00 à Paris (7:00 UTC) -> 8:00 UTC : 60 minutes ; une heure flottante est
+        # lue à Paris, et un fuseau inconnu rejette la ligne.
+        compte, talks = self.importer(
+            "BEGIN:VCALENDAR\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Lecon\\, route\r\nCATEGORIES:a\\,b,c\r\n"
+            "DTSTART;TZID=Europe/Paris:20220913T090000\r\nDTEND:20220913T080000Z\r\nEND:VEVENT\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Code\\; examen\\\\blanc\r\n"
+            "DTSTART:20220913T090000\r\nDTEND;TZID=\"Europe/London\":20220913T083000\r\nEND:VEVENT\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Ailleurs\r\n"
+            "DTSTART;TZID=Nulle/Part:20220913T090000\r\nDTEND:20220913T100000Z\r\nEND:VEVENT\r\n"
+            "END:VCALENDAR\r\n")
+        self.assertEqual(compte, (2, 1))
+        self.assertEqual(talks, [("Lecon, route", 60, ["a,b", "c"]), ("Code; examen\\blanc", 30, [])])
+
+    def test_lignes_illisibles_rejetees(self):
+        compte, talks = self.importer(
+            "BEGIN:VCALENDAR\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Casse\r\nDTSTART:2022-09-13\r\nDTEND:20220914\r\nEND:VEVENT\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Trop long\r\nDURATION:P1W\r\nEND:VEVENT\r\n"
+            "BEGIN:VEVENT\r\nSUMMARY:Conduite\r\nDURATION:PT70M\r\nEND:VEVENT\r\n"
+            "END:VCALENDAR\r\n")
+        self.assertEqual(compte, (1, 2))
+        self.assertEqual(talks, [("Conduite", 70, [])])
+
+    def test_csv(self):
+        compte, talks = self.importer("name,duration,tags\nConduite,70,route\nCode,x,\nExamen,30,\nPuissance,²,\n", ".csv")
+        self.assertEqual(compte, (2, 2))
+        self.assertEqual(talks, [("Conduite", 70, ["route"]), ("Examen", 30, [])])
+
+    def test_ecriture_sqlite(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            base = os.path.join(dossier, "talks.db")
+            with creneaux.SqliteTalkWriter(base) as writer:
+                compte = creneaux.importTalks([["Conduite", "70", "route"], ["Code", "x"]], writer)
+            self.assertEqual(compte, (1, 1))
+            with self.assertRaises(sqlite3.ProgrammingError):
+                writer.conn.execute("SELECT 1")
+            with contextlib.closing(sqlite3.connect(base)) as conn:
+                self.assertEqual(conn.execute("SELECT name, duration, tags FROM talks").fetchall(),
+                                 [("Conduite", 70, "route")])
+
+
+if __name__ == "__main__":
+    unittest.main()
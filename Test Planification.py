@@ -0,0 +1,211 @@
+import importlib.util
+import os
+import random
+import sys
+import time
+import unittest
+
+
+def charger(nom, fichier):
+    # Les scripts du projet ont des espaces dans leur nom : on les charge par chemin.
+    chemin = os.path.join(os.path.dirname(os.path.abspath(__file__)), fichier)
+    spec = importlib.util.spec_from_file_location(nom, chemin)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[nom] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+programmation = charger("calendrier_programmation", "Calendrier Programmation.py")
+
+
+def demandes_au_hasard(rng, visiteurs, personnes, par_visiteur):
+    return {f"V{i}": rng.sample(range(personnes), par_visiteur) for i in range(visiteurs)}
+
+
+def maximum_theorique(requests, people, slots):
+    # b-couplage maximum calculé à part (flot par chemins augmentants sur le graphe
+    # source -> visiteurs -> personnes -> puits) pour contrôler Planning.
+    capacite = {}
+    def arc(a, b, c):
+        capacite[(a, b)] = capacite.get((a, b), 0) + c
+        capacite.setdefault((b, a), 0)
+    for v, ps in requests.items():
+        arc("source", ("v", v), len(slots))
+        for p in ps:
+            arc(("v", v), ("p", p), 1)
+    for p, person in people.items():
+        arc(("p", p), "puits", len(slots) - bin(person.busy).count("1"))
+    voisins = {}
+    for a, b in capacite:
+        voisins.setdefault(a, []).append(b)
+    flot = 0
+    while True:
+        parent = {"source": None}
+        file = ["source"]
+        while file and "puits" not in parent:
+            a = file.pop(0)
+            for b in voisins.get(a, ()):
+                if b not in parent and capacite[(a, b)] > 0:
+                    parent[b] = a
+                    file.append(b)
+        if "puits" not in parent:
+            return flot
+        b = "puits"
+        while parent[b] is not None:
+            a = parent[b]
+            capacite[(a, b)] -= 1
+            capacite[(b, a)] += 1
+            b = a
+        flot += 1
+
+
+class PlanningTests(unittest.TestCase):
+    def verifier(self, planning):
+        # Aucun créneau pris deux fois, ni bloqué, et les bitsets des personnes à jour.
+        pris = set()
+        for (v, p), index in planning.bookings.items():
+            self.assertNotIn(("p", p, index), pris)
+            self.assertNotIn(("v", v, index), pris)
+            pris.add(("p", p, index))
+            pris.add(("v", v, index))
+            self.assertFalse(planning.blocked[p] >> index & 1)
+            self.assertTrue(planning.people[p].busy >> index & 1)
+        for p, person in planning.people.items():
+            self.assertEqual(person.busy, planning.personBusy[p])
+
+    def test_selection_maximum_contre_exemple(self):
+        # Degré maximum 2 : un planning sur 2 créneaux existe pour 8 des 10 demandes.
+        slots = ["9:00AM", "10:15AM"]
+        people = {p: programmation.Person(p, slots) for p in "PQRSTU"}
+        requests = {"Y1": ["P", "T", "R"], "Y2": ["P"], "Z1": ["Q", "U", "S"], "Z2": ["Q"], "X": ["P", "Q"]}
+        planning = programmation.Planning(requests, people, slots)
+        planning.solve()
+        self.verifier(planning)
+        self.assertEqual(len(planning.bookings), 8)
+
+    def test_optimise_atteint_le_maximum(self):
+        for seed in range(10):
+            rng = random.Random(seed)
+            slots = list(range(7))
+            requests = demandes_au_hasard(rng, 40, 20, 3)
+            people = {p: programmation.Person(p, slots) for p in range(20)}
+            for person in people.values():
+                person.busy = 1 << rng.randrange(7) if rng.random() < 0.3 else 0
+            maximum = maximum_theorique(requests, people, slots)
+            planning = programmation.Planning(requests, people, slots)
+            planning.solve()
+            self.verifier(planning)
+            greedy = {p: programmation.Person(p, slots) for p in range(20)}
+            for p, person in greedy.items():
+                person.busy = planning.blocked[p]
+            servis = sum(1 for v, ps in requests.items()
+                         for heure in programmation.Visitor(v, ps, greedy, slots).schedule.values()
+                         if heure != "heure indisponible")
+            self.assertLessEqual(len(planning.bookings), maximum)
+            self.assertGreaterEqual(len(planning.bookings), servis)
+            if not any(planning.blocked.values()):
+                self.assertEqual(len(planning.bookings), maximum)
+
+    def test_modifications_incrementales(self):
+        # 300 changements au hasard : le planning reste valide et chaque RDV déplacé
+        # ou perdu figure dans le résultat renvoyé.
+        rng = random.Random(1)
+        slots = list(range(7))
+        people = {p: programmation.Person(p, slots) for p in range(20)}
+        planning = programmation.Planning(demandes_au_hasard(rng, 40, 20, 3), people, slots)
+        planning.solve()
+        for step in range(300):
+            avant = dict(planning.bookings)
+            choix = rng.random()
+            if choix < 0.4:
+                changes = planning.blockPerson(rng.randrange(20), rng.randrange(7))
+            elif choix < 0.6:
+                changes = planning.unblockPerson(rng.randrange(20), rng.randrange(7))
+            elif choix < 0.8:
+                changes = planning.addVisitor(f"N{step}", rng.sample(range(20), 3))
+            else:
+                changes = planning.removeVisitor(rng.choice(list(planning.requests)))
+            self.verifier(planning)
+            modifies = {k for k in set(avant) | set(planning.bookings) if avant.get(k) != planning.bookings.get(k)}
+            self.assertLessEqual(modifies, set(changes))
+            for (v, p), heure in changes.items():
+                attendu = slots[planning.bookings[(v, p)]] if (v, p) in planning.bookings else "heure indisponible"
+                self.assertEqual(heure, attendu)
+
+    def test_bloquer_un_creneau_deplace_le_rdv(self):
+        slots = ["9:00AM", "10:15AM"]
+        people = {p: programmation.Person(p, slots) for p in "AB"}
+        planning = programmation.Planning({"S1": ["A"]}, people, slots)
+        planning.solve()
+        self.assertEqual(planning.blockPerson("A", planning.bookings[("S1", "A")]), {("S1", "A"): "10:15AM"})
+        self.assertEqual(planning.blockPerson("A", 1), {("S1", "A"): "heure indisponible"})
+        self.assertEqual(planning.unblockPerson("A", 0), {("S1", "A"): "9:00AM"})
+        self.assertEqual(planning.unblockPerson("A", 0), {})
+
+    def test_ajout_avec_personne_inconnue_sans_effet(self):
+        slots = ["9:00AM", "10:15AM"]
+        people = {p: programmation.Person(p, slots) for p in "AB"}
+        planning = programmation.Planning({"S1": ["A"]}, people, slots)
+        planning.solve()
+        avant = (dict(planning.bookings), dict(planning.requests), {p: people[p].busy for p in people})
+        with self.assertRaises(ValueError):
+            planning.addVisitor("S1", ["B", "Z"])
+        self.assertEqual((dict(planning.bookings), dict(planning.requests), {p: people[p].busy for p in people}), avant)
+        self.verifier(planning)
+        planning.solve()
+        self.assertEqual(planning.bookings, {("S1", "A"): 0})
+
+    def test_parallele_identique_au_sequentiel(self):
+        # Plusieurs sites indépendants : la résolution par groupes dans des processus
+        # donne exactement les RDV et les bitsets de Planning.solve.
+        def instance():
+            rng = random.Random(3)
+            slots = list(range(10))
+            people = {}
+            requests = {}
+            for site in range(6):
+                for i in range(8):
+                    people[(site, i)] = programmation.Person((site, i), slots)
+                for j in range(30):
+                    requests[(site, j)] = [(site, i) for i in rng.sample(range(8), 3)]
+            return requests, people, slots
+        requests, people, slots = instance()
+        sequentiel = programmation.Planning(requests, people, slots)
+        sequentiel.solve()
+        requests, autres, slots = instance()
+        parallele = programmation.solveParallel(requests, autres, slots, workers=2)
+        self.assertEqual(len(parallele.components()), 6)
+        self.assertEqual(parallele.bookings, sequentiel.bookings)
+        for p in people:
+            self.assertEqual(people[p].busy, autres[p].busy)
+
+    def test_parallele_respecte_une_seule_echeance(self):
+        # Échéance déjà passée : aucun groupe ne repart avec une limite complète, mais
+        # les RDV qui ont un créneau commun libre sont quand même placés.
+        rng = random.Random(4)
+        slots = list(range(7))
+        people = {p: programmation.Person(p, slots) for p in range(20)}
+        debut = time.monotonic()
+        planning = programmation.solveParallel(demandes_au_hasard(rng, 40, 20, 3), people, slots, timeLimit=0, workers=2)
+        self.assertLess(time.monotonic() - debut, 5)
+        self.verifier(planning)
+        self.assertTrue(planning.bookings)
+
+    def test_limite_de_temps_courte_garde_des_rdv(self):
+        # La limite expire pendant la sélection : le planning rendu n'est pas vide.
+        rng = random.Random(5)
+        slots = list(range(7))
+        people = {p: programmation.Person(p, slots) for p in range(200)}
+        requests = demandes_au_hasard(rng, 3000, 200, 3)
+        planning = programmation.Planning(requests, people, slots)
+        planning.solve(0.001)
+        self.verifier(planning)
+        self.assertGreater(len(planning.bookings), 0)
+        complet = programmation.Planning(requests, {p: programmation.Person(p, slots) for p in range(200)}, slots)
+        complet.solve()
+        self.assertLessEqual(len(planning.bookings), len(complet.bookings))
+
+
+if __name__ == "__main__":
+    unittest.main()